@@ -5,6 +5,9 @@ Now with “Add Text” mode to place arbitrary text anywhere on a page.
 
 from __future__ import annotations
 
+import math
+from typing import TYPE_CHECKING
+
 # ---------- Qt imports ----------
 from PySide6.QtWidgets import (
     QMainWindow,
@@ -24,16 +27,45 @@ from PySide6.QtWidgets import (
     QDialogButtonBox,
     QInputDialog,
 )
-from PySide6.QtGui import QAction, QPixmap, QImage
-from PySide6.QtCore import Qt, QEvent, QObject
+from PySide6.QtGui import QAction, QPixmap, QPixmapCache, QImage, QPainter
+from PySide6.QtCore import (
+    Qt,
+    QEvent,
+    QObject,
+    QTimer,
+    QSize,
+    Signal,
+)
 
 # ---------- Local ----------
-from pdf_engine import PDFEngine
+# PyMuPDF is the slowest import of the app; it is loaded on the first open
+# so the window can paint before it.
+if TYPE_CHECKING:
+    from pdf_engine import PDFEngine, RenderedPage
+
+
+def _to_qimage(pix: RenderedPage) -> QImage:
+    """Wrap a MuPDF raster in a QImage without touching individual pixels.
+
+    MuPDF emits packed RGB/RGBA bytes, which are exactly Qt's RGB888 and
+    RGBA8888 layouts, so no channel swap or premultiply pass is needed; any
+    further conversion happens inside Qt's C++ blitters.
+    """
+    fmt = QImage.Format_RGBA8888 if pix.alpha else QImage.Format_RGB888
+    return QImage(pix.samples, pix.width, pix.height, pix.stride, fmt)
+
+
+class _RenderSignals(QObject):
+    """Carries finished worker-process renders back to the GUI thread."""
+
+    finished = Signal(object)  # concurrent.futures.Future from submit_render
 
 
 class PDFEditor(QMainWindow):
     """Main application window."""
 
+    RENDER_ZOOM = 1.5  # fallback before the page label has been laid out
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Lean PDF Editor")
@@ -41,6 +73,25 @@ class PDFEditor(QMainWindow):
 
         self.engine: PDFEngine | None = None
         self.add_text_mode: bool = False  # toggled by toolbar button
+        self._last_pixmap: QPixmap | None = None  # unscaled render of current page
+        self._current_pix = None  # keeps the QImage's sample buffer alive
+        self._current_zoom: float = self.RENDER_ZOOM  # zoom of _last_pixmap
+        # label -> PDF mapping of the shown pixmap: (offset_x, offset_y, sx, sy)
+        self._pdf_transform: tuple[int, int, float, float] | None = None
+        self._render_pending: bool = False  # _last_pixmap is only a placeholder
+        # In-flight worker renders: future -> (engine, index, zoom, page revision)
+        self._render_jobs: dict = {}
+        self._prefetch_jobs: set = set()  # the subset of futures that are prefetches
+
+        # Worker-process renders complete on a pool thread and are delivered here
+        self._render_signals = _RenderSignals(self)
+        self._render_signals.finished.connect(self._on_render_finished)
+
+        # Re-render only once the user stops resizing; stretch the old pixmap meanwhile
+        self._resize_timer = QTimer(self)
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.setInterval(150)
+        self._resize_timer.timeout.connect(self._rerender_current_page)
 
         self._create_actions()
         self._create_ui()
@@ -116,12 +167,20 @@ class PDFEditor(QMainWindow):
         path, _ = QFileDialog.getOpenFileName(self, "Open PDF", "", "PDF Files (*.pdf)")
         if not path:
             return
+        from pdf_engine import PDFEngine
+
         try:
             self.engine = PDFEngine(path)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Could not open PDF:\n{e}")
             return
 
+        # Let Qt keep roughly as many screen-sized pages as the engine caches
+        screen = self.screen().size()
+        page_kib = screen.width() * screen.height() * 4 // 1024
+        QPixmapCache.setCacheLimit(PDFEngine.RENDER_CACHE_SIZE * page_kib)
+        QPixmapCache.clear()
+
         # Enable previously disabled controls
         total = self.engine.page_count()
         self.page_spin.setMaximum(total)
@@ -135,45 +194,225 @@ class PDFEditor(QMainWindow):
         ):
             w.setEnabled(True)
 
-        self.show_page(0)
+        # Most pages rasterise far quicker than a worker process starts up,
+        # so paint the first one here; prefetching its neighbours then
+        # brings the workers up.
+        self.show_page(0, in_process=True)
 
     def save_file(self):
         if not self.engine:
             return
-        out, _ = QFileDialog.getSaveFileName(self, "Save PDF As", "", "PDF Files (*.pdf)")
+        out, _ = QFileDialog.getSaveFileName(
+            self, "Save PDF As", self.engine.path, "PDF Files (*.pdf)"
+        )
         if not out:
             return
+        # Saving over the open file appends just the changes (incremental)
+        # unless there are so many that a full, compacted rewrite is better;
+        # anywhere else always gets the rewrite.
+        incremental = (
+            self.engine.is_source(out) and self.engine.can_save_incrementally()
+        )
         try:
-            # 🔥 Force a full save instead of incremental
-            self.engine.save(out, incremental=False)
+            self.engine.save(out, incremental=incremental)
             QMessageBox.information(self, "Saved", "PDF saved successfully.")
         except Exception as e:
             QMessageBox.critical(self, "Save Error", f"Could not save:\n{e}")
 
 
     # ===== Page navigation & rendering ====================================
-    def show_page(self, index: int):
-        """Render page *index* into the QLabel."""
+    def show_page(self, index: int, in_process: bool = False):
+        """Render page *index* into the QLabel.
+
+        Uncached pages render in a worker process unless *in_process* is set.
+        """
         if not self.engine:
             return
         self.engine.current_page = index
-        pix = self.engine.render_page(index, zoom=1.5)
-        fmt = QImage.Format_RGBA8888 if pix.alpha else QImage.Format_RGB888
-        img = QImage(pix.samples, pix.width, pix.height, pix.stride, fmt)
-        self.page_label.setPixmap(
-            QPixmap.fromImage(img).scaled(
-                self.page_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation
-            )
-        )
+        self._current_zoom = zoom = self._fit_zoom(index)
+        self._cancel_prefetches(keep=(index, zoom))
         # Sync spinbox without recursion
         self.page_spin.blockSignals(True)
         self.page_spin.setValue(index + 1)
         self.page_spin.blockSignals(False)
 
+        pm = QPixmap()
+        if QPixmapCache.find(self._pixmap_key(index, zoom), pm):
+            self._display_page(pm)
+            return
+        pix = self.engine.cached_render(index, zoom)
+        if pix is not None:
+            self._display_page(self._pixmap_from_render(index, zoom, pix))
+            return
+
+        # Nothing cached – show a stand-in and rasterise in a worker process
+        if self._render_in_flight(index, zoom):
+            self._display_placeholder(index, zoom)
+            return
+        future = None if in_process else self.engine.submit_render(index, zoom)
+        if future is None:
+            # Edited pages exist only in this process, and the caller may not
+            # want to wait for a worker; either way this render blocks the GUI
+            try:
+                pix = self.engine.render_page(index, zoom=zoom)
+            except Exception as e:
+                self._display_render_error(index, e)
+                return
+            self._display_page(self._pixmap_from_render(index, zoom, pix))
+            return
+        self._display_placeholder(index, zoom)
+        self._track_render(future, index, zoom)
+
+    def _render_in_flight(self, index: int, zoom: float) -> bool:
+        return (self.engine, index, zoom) in (
+            job[:3] for job in self._render_jobs.values()
+        )
+
+    def _track_render(self, future, index: int, zoom: float):
+        revision = self.engine.page_revision(index)
+        self._render_jobs[future] = (self.engine, index, zoom, revision)
+        future.add_done_callback(self._render_signals.finished.emit)
+
+    def _on_render_finished(self, future):
+        engine, index, zoom, revision = self._render_jobs.pop(future)
+        self._prefetch_jobs.discard(future)
+        # Only the page currently waiting on a placeholder gets displayed;
+        # anything else just lands in the engine's render cache.
+        awaited = (
+            self._render_pending
+            and engine is self.engine
+            and index == engine.current_page
+            and zoom == self._current_zoom
+        )
+        if future.cancelled():
+            if awaited:
+                # The pool was shut down (e.g. by a save); ask again afterwards
+                QTimer.singleShot(0, self._rerender_current_page)
+            return
+        try:
+            raster = future.result()
+        except Exception as e:
+            if awaited:
+                self._display_render_error(index, e)
+            return
+        pix = engine.adopt_render(index, zoom, revision, raster)
+        if not awaited:
+            return
+        if pix is None:
+            self.show_page(index)  # page was edited meanwhile; render it afresh
+        else:
+            self._display_page(self._pixmap_from_render(index, zoom, pix))
+
+    def _display_render_error(self, index: int, error: Exception):
+        """Replace the page with an error message instead of a stuck placeholder."""
+        self._render_pending = False
+        self._last_pixmap = None
+        self._pdf_transform = None
+        self.page_label.setText(f"Could not render page {index + 1}:\n{error}")
+
+    def _pixmap_from_render(self, index: int, zoom: float, pix: RenderedPage) -> QPixmap:
+        # QImage wraps the pixmap's buffer without copying; hold on to the owner
+        self._current_pix = pix
+        pm = QPixmap.fromImage(_to_qimage(pix))
+        QPixmapCache.insert(self._pixmap_key(index, zoom), pm)
+        return pm
+
+    def _display_page(self, pm: QPixmap):
+        """Show a finished render of the current page and warm its neighbours."""
+        self._render_pending = False
+        # Already rendered at the label's size – no second resample needed
+        self._last_pixmap = pm
+        self.page_label.setPixmap(self._last_pixmap)
+        self._update_pdf_transform()
+        self._prefetch_neighbours(self.engine.current_page)
+
+    def _display_placeholder(self, index: int, zoom: float):
+        """Show a stand-in for the page, correctly sized, while it renders."""
+        pdf_w, pdf_h = self.engine.page_size(index)
+        size = QSize(max(1, round(pdf_w * zoom)), max(1, round(pdf_h * zoom)))
+        preview = self.engine.shrunk_render(index, zoom)
+        if preview is not None:
+            # Only a <2x reduction is left, where bilinear filtering holds up
+            pm = QPixmap.fromImage(_to_qimage(preview)).scaled(
+                size, Qt.IgnoreAspectRatio, Qt.SmoothTransformation
+            )
+        else:
+            pm = QPixmap(size)
+            pm.fill(Qt.white)
+            painter = QPainter(pm)
+            painter.drawText(pm.rect(), Qt.AlignCenter, "Rendering…")
+            painter.end()
+        self._render_pending = True
+        self._last_pixmap = pm
+        self.page_label.setPixmap(self._last_pixmap)
+        self._update_pdf_transform()
+
+    def _pixmap_key(self, index: int, zoom: float) -> str:
+        """QPixmapCache key; the page revision retires entries of edited pages."""
+        rev = self.engine.page_revision(index)
+        return f"{id(self.engine)}:{index}:{rev}:{zoom:.2f}"
+
+    def _prefetch_neighbours(self, index: int):
+        """Warm the render cache for the pages either side of *index*."""
+        for neighbour in (index + 1, index - 1):
+            if not 0 <= neighbour < self.engine.page_count():
+                continue
+            zoom = self._fit_zoom(neighbour)
+            if self.engine.cached_render(neighbour, zoom) is not None:
+                continue
+            if self._render_in_flight(neighbour, zoom):
+                continue
+            future = self.engine.submit_render(neighbour, zoom)
+            if future is None:
+                continue  # edited pages only render in-process, on demand
+            self._prefetch_jobs.add(future)  # before tracking: it may finish at once
+            self._track_render(future, neighbour, zoom)
+
+    def _cancel_prefetches(self, keep: tuple[int, float]):
+        """Drop queued prefetches the user has navigated away from.
+
+        A prefetch already running in a worker cannot be stopped; it simply
+        finishes into the render cache without touching the GUI.
+        """
+        for future in list(self._prefetch_jobs):
+            if self._render_jobs[future][:3] != (self.engine, *keep):
+                future.cancel()
+
+    def _fit_zoom(self, index: int) -> float:
+        """Zoom at which page *index* exactly fits the page label."""
+        lab_w, lab_h = self.page_label.width(), self.page_label.height()
+        pdf_w, pdf_h = self.engine.page_size(index)
+        zoom = min(lab_w / pdf_w, lab_h / pdf_h)
+        if zoom <= 0:
+            return self.RENDER_ZOOM
+        # Round down so tiny resizes still hit the render cache and the render
+        # never outgrows the label (which would push the window bigger)
+        return max(math.floor(zoom * 100) / 100, 0.01)
+
+    def closeEvent(self, ev):
+        if self.engine:  # worker processes only exist once a PDF was opened
+            from pdf_engine import shutdown_render_pool
+
+            shutdown_render_pool()
+        super().closeEvent(ev)
+
     def resizeEvent(self, ev):
+        super().resizeEvent(ev)
+        if not self.engine:
+            return
+        # Cheap bitmap stretch during the drag, full re-render when it settles
+        if self._last_pixmap is not None:
+            self.page_label.setPixmap(
+                self._last_pixmap.scaled(
+                    self.page_label.size(), Qt.KeepAspectRatio, Qt.FastTransformation
+                )
+            )
+            self._update_pdf_transform()
+        self._resize_timer.start()
+
+    def _rerender_current_page(self):
         if self.engine:
             self.show_page(self.engine.current_page)
-        super().resizeEvent(ev)
 
     def prev_page(self):
         if self.engine and self.engine.current_page > 0:
@@ -195,6 +434,8 @@ class PDFEditor(QMainWindow):
 
     def eventFilter(self, obj: QObject, ev: QEvent) -> bool:
         """Intercept clicks on the page label when in add-text mode."""
+        if obj is self.page_label and ev.type() == QEvent.Resize and self.engine:
+            self._update_pdf_transform()  # centring offsets moved
         if (
             obj is self.page_label
             and self.add_text_mode
@@ -206,10 +447,26 @@ class PDFEditor(QMainWindow):
             return True  # event consumed
         return super().eventFilter(obj, ev)
 
+    def _update_pdf_transform(self):
+        """Recompute the label → PDF mapping for the pixmap now on display."""
+        pixmap = self.page_label.pixmap()
+        if not pixmap or pixmap.isNull():
+            self._pdf_transform = None
+            return
+        lab_w, lab_h = self.page_label.width(), self.page_label.height()
+        pm_w, pm_h = pixmap.width(), pixmap.height()
+        pdf_w, pdf_h = self.engine.page_size(self.engine.current_page)
+        # Centered pixmap inside label – find offsets
+        self._pdf_transform = (
+            (lab_w - pm_w) // 2,
+            (lab_h - pm_h) // 2,
+            pdf_w / pm_w,
+            pdf_h / pm_h,
+        )
+
     def _handle_add_text_click(self, pos_label):
         """Convert label coords → PDF coords and insert text."""
-        pixmap = self.page_label.pixmap()
-        if not pixmap:
+        if self._pdf_transform is None:
             return
 
         # Prompt user for the text content
@@ -217,26 +474,31 @@ class PDFEditor(QMainWindow):
         if not (ok and text):
             return
 
-        # Convert label position to position inside the pixmap
-        lab_w, lab_h = self.page_label.width(), self.page_label.height()
-        pm_w, pm_h = pixmap.width(), pixmap.height()
-        # Centered pixmap inside label – find offsets
-        offset_x = (lab_w - pm_w) // 2
-        offset_y = (lab_h - pm_h) // 2
-        x_in_pixmap = pos_label.x() - offset_x
-        y_in_pixmap = pos_label.y() - offset_y
-        if not (0 <= x_in_pixmap <= pm_w and 0 <= y_in_pixmap <= pm_h):
-            return  # click was in padding area
-
         # Map to PDF coordinate space
-        page = self.engine.doc.load_page(self.engine.current_page)
-        pdf_w, pdf_h = page.rect.width, page.rect.height
-        x_pdf = x_in_pixmap * (pdf_w / pm_w)
-        y_pdf = y_in_pixmap * (pdf_h / pm_h)
+        ox, oy, sx, sy = self._pdf_transform
+        x_pdf = (pos_label.x() - ox) * sx
+        y_pdf = (pos_label.y() - oy) * sy
+        pdf_w, pdf_h = self.engine.page_size(self.engine.current_page)
+        if not (0 <= x_pdf <= pdf_w and 0 <= y_pdf <= pdf_h):
+            return  # click was in padding area
 
         # Insert text at the mapped coordinates (default 12 pt)
-        self.engine.insert_text(self.engine.current_page, x_pdf, y_pdf, text)
-        self.show_page(self.engine.current_page)  # refresh
+        rect = self.engine.insert_text(self.engine.current_page, x_pdf, y_pdf, text)
+        self._repaint_region(rect)
+
+    def _repaint_region(self, rect):
+        """Re-render only *rect* of the current page and paint it in place."""
+        if self._last_pixmap is None or self._render_pending:
+            self.show_page(self.engine.current_page)
+            return
+        pix = self.engine.render_clip(self.engine.current_page, rect, self._current_zoom)
+        painter = QPainter(self._last_pixmap)
+        painter.drawImage(pix.x, pix.y, _to_qimage(pix))
+        painter.end()
+        self.page_label.setPixmap(self._last_pixmap)
+        # The patched pixmap is exactly what a fresh render would produce
+        key = self._pixmap_key(self.engine.current_page, self._current_zoom)
+        QPixmapCache.insert(key, self._last_pixmap)
 
     # ===== Form-field dialog ==============================================
     def open_fields_dialog(self):
@@ -249,9 +511,10 @@ class PDFEditor(QMainWindow):
 
         dlg = FieldsDialog(fields, self)
         if dlg.exec() == QDialog.Accepted:
-            for name, value in dlg.get_updates().items():
-                self.engine.update_form_field(name, value)
-            self.show_page(self.engine.current_page)
+            updates = dlg.get_updates()
+            if updates:
+                self.engine.update_form_fields(updates)
+                self.show_page(self.engine.current_page)
 
 
 class FieldsDialog(QDialog):
@@ -262,6 +525,7 @@ class FieldsDialog(QDialog):
         self.setWindowTitle("Edit Form Fields")
         self.resize(500, 400)
         self._updates: dict[str, str] = {}
+        self._original: dict[str, str] = {}  # as shown, to report only edits
 
         vbox = QVBoxLayout(self)
 
@@ -272,11 +536,25 @@ class FieldsDialog(QDialog):
             QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed
         )
 
+        # Fill the table in one go: no re-sorting, repaints or itemChanged
+        # emissions per cell while hundreds of rows go in.
+        sorting = self.table.isSortingEnabled()
+        self.table.setSortingEnabled(False)
+        self.table.setUpdatesEnabled(False)
+        self.table.blockSignals(True)
+        read_only = Qt.ItemIsSelectable | Qt.ItemIsEnabled
         for row, f in enumerate(fields):
             name_item = QTableWidgetItem(f["name"])
-            name_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
+            name_item.setFlags(read_only)
+            value = f["value"]
+            if not isinstance(value, str):
+                value = str(value or "")
+            self._original.setdefault(f["name"], value)
             self.table.setItem(row, 0, name_item)
-            self.table.setItem(row, 1, QTableWidgetItem(str(f["value"] or "")))
+            self.table.setItem(row, 1, QTableWidgetItem(value))
+        self.table.blockSignals(False)
+        self.table.setUpdatesEnabled(True)
+        self.table.setSortingEnabled(sorting)
 
         vbox.addWidget(self.table)
 
@@ -289,7 +567,8 @@ class FieldsDialog(QDialog):
         for row in range(self.table.rowCount()):
             name = self.table.item(row, 0).text()
             val = self.table.item(row, 1).text()
-            self._updates[name] = val
+            if val != self._original[name]:
+                self._updates[name] = val
         super().accept()
 
     def get_updates(self) -> dict[str, str]:
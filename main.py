@@ -1,8 +1,13 @@
+import multiprocessing
 import sys
-from PySide6.QtWidgets import QApplication
-from editor_gui import PDFEditor
 
 def main():
+    multiprocessing.freeze_support()  # render workers in PyInstaller builds
+    # Imported here so spawned render workers, which re-run this module as
+    # __mp_main__, don't load Qt and the GUI
+    from PySide6.QtWidgets import QApplication
+    from editor_gui import PDFEditor
+
     app = QApplication(sys.argv)
     editor = PDFEditor()
     editor.show()
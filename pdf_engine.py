@@ -1,63 +1,515 @@
 """Lean wrapper around PyMuPDF, now version-agnostic re: widgets()."""
 
+import hashlib
+import math
+import mmap
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
 import fitz  # PyMuPDF
 
 
+@dataclass(frozen=True)
+class RenderedPage:
+    """Raw raster of a page, detached from its page so it can be cached."""
+
+    samples: memoryview  # zero-copy view into *pixmap*'s buffer
+    width: int
+    height: int
+    stride: int
+    alpha: bool
+    pixmap: fitz.Pixmap  # owns the memory behind *samples*
+    x: int = 0  # origin within the full page raster (non-zero for clips)
+    y: int = 0
+
+
 class PDFEngine:
+    RENDER_CACHE_SIZE = 32  # pages kept rasterised in memory
+    PAGE_CACHE_SIZE = 8  # parsed fitz.Page objects kept alive
+    DISK_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "plexipdf")
+    DISK_CACHE_LIMIT = 200 * 1024 * 1024  # bytes of PNGs kept across sessions
+    # PNG encoding costs more than rendering an ordinary page; only keep
+    # renders that took at least this long (seconds)
+    DISK_CACHE_MIN_RENDER_TIME = 0.05
+    INCREMENTAL_SAVE_MAX_OPS = 20  # more edits than this get a full rewrite
+
     def __init__(self, path: str):
-        self.doc = fitz.open(path)
         self.current_page = 0
+        self._page_cache: OrderedDict[tuple[int, float], RenderedPage] = OrderedDict()
+        # fitz.Document is not thread-safe; background prefetch shares this lock
+        self._lock = threading.RLock()
+        self._page_revisions: dict[int, int] = {}  # bumped on every page edit
+        self._page_rects: dict[int, tuple[float, float]] = {}  # page_size memo
+        self._open(path)
+        self._sweep_disk_cache()
+
+    def _open(self, path: str):
+        """Map and parse *path*, (re)setting all per-file state."""
+        self.path = path
+        # Map the file so MuPDF reads objects straight from the page cache
+        with open(path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, "MADV_RANDOM"):          # xref access is scattered
+            self._mm.madvise(mmap.MADV_RANDOM)
+        self._view = memoryview(self._mm)
+        self._page_lru: OrderedDict[int, fitz.Page] = OrderedDict()
+        self.doc = fitz.open(stream=self._view, filetype="pdf")
+
+        # Renders of untouched pages survive restarts, keyed by file identity
+        self._doc_key = (
+            hashlib.sha1(self._mm[:65536]).hexdigest()[:16]
+            + f"-{os.path.getmtime(path):.0f}"
+        )
+        self._modified_pages: set[int] = set()  # in-memory edits; disk cache is stale
+        self._dirty_ops = 0  # edits since the file was opened or last saved
+        # field name -> (page number, widget position on that page), built lazily
+        self._widget_index: dict[str, tuple[int, int]] | None = None
+
+    def close(self):
+        """Close the document and unmap the underlying file."""
+        mm = getattr(self, "_mm", None)
+        if mm is None:
+            return
+        self._page_lru.clear()                    # pages must go before the doc
+        if getattr(self, "doc", None) is not None:
+            self.doc.close()
+        self._view.release()
+        mm.close()
+        self._mm = None
+
+    def __del__(self):
+        self.close()
+
+    def _page(self, page_number: int) -> fitz.Page:
+        """Return a loaded page, reusing recently parsed ones (call under lock)."""
+        page = self._page_lru.pop(page_number, None)
+        if page is None:
+            page = self.doc.load_page(page_number)
+        self._page_lru[page_number] = page
+        if len(self._page_lru) > self.PAGE_CACHE_SIZE:
+            self._page_lru.popitem(last=False)
+        return page
 
     # ---------- Rendering --------------------------------------------------
     def page_count(self) -> int:
         return len(self.doc)
 
-    def render_page(self, page_number: int, zoom: float = 2.0):
-        page = self.doc.load_page(page_number)
-        return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    def page_size(self, page_number: int) -> tuple[float, float]:
+        """Return the (width, height) of a page in PDF points."""
+        size = self._page_rects.get(page_number)
+        if size is None:
+            with self._lock:
+                rect = self._page(page_number).rect
+            size = self._page_rects[page_number] = (rect.width, rect.height)
+        return size
+
+    def render_page(self, page_number: int, zoom: float = 2.0) -> RenderedPage:
+        key = (page_number, zoom)
+        with self._lock:
+            cached = self._page_cache.get(key)
+            if cached is not None:
+                self._page_cache.move_to_end(key)
+                return cached
+
+            # Edited pages differ from the file the disk cache is keyed on
+            persist = page_number not in self._modified_pages
+            doc_key = self._doc_key
+            pix = self._load_cached_png(doc_key, page_number, zoom) if persist else None
+            if pix is None:
+                page = self._page(page_number)
+                start = time.perf_counter()
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+                elapsed = time.perf_counter() - start
+                persist = persist and elapsed >= self.DISK_CACHE_MIN_RENDER_TIME
+            else:
+                persist = False
+            rendered = RenderedPage(
+                pix.samples_mv, pix.width, pix.height, pix.stride, bool(pix.alpha), pix
+            )
+            self._remember_render(key, rendered)
+
+        # Encoding and writing the PNG needs nothing from the document
+        if persist:
+            self._store_cached_png(doc_key, page_number, zoom, pix)
+        return rendered
+
+    def _remember_render(self, key: tuple[int, float], rendered: RenderedPage):
+        """Add a render to the in-memory LRU (call under lock)."""
+        self._page_cache[key] = rendered
+        if len(self._page_cache) > self.RENDER_CACHE_SIZE:
+            self._page_cache.popitem(last=False)  # evict least recently used
+
+    def submit_render(self, page_number: int, zoom: float) -> Future | None:
+        """Start rendering a page in a worker process.
+
+        PyMuPDF holds the GIL while rasterising, so only another process
+        keeps the GUI responsive. Returns None for pages edited in memory –
+        the worker can only see the file – which must go through render_page.
+        Pass the future's result to adopt_render.
+        """
+        if page_number in self._modified_pages:
+            return None
+        args = (_render_in_worker, self.path, self._doc_key, page_number, zoom)
+        try:
+            return _render_pool().submit(*args)
+        except BrokenProcessPool:
+            # A worker died (e.g. crashed in MuPDF); start over with a fresh pool
+            shutdown_render_pool()
+            return _render_pool().submit(*args)
+
+    def adopt_render(
+        self, page_number: int, zoom: float, revision: int, raster: tuple
+    ) -> RenderedPage | None:
+        """Cache a raster from submit_render; None if the page was edited since.
+
+        *revision* is the page_revision() at the time the render was submitted.
+        """
+        samples, width, height, _stride, alpha = raster
+        pix = fitz.Pixmap(fitz.csRGB, width, height, samples, alpha)
+        rendered = RenderedPage(
+            pix.samples_mv, pix.width, pix.height, pix.stride, bool(pix.alpha), pix
+        )
+        with self._lock:
+            if self.page_revision(page_number) != revision:
+                return None
+            self._remember_render((page_number, zoom), rendered)
+        return rendered
+
+    def cached_render(self, page_number: int, zoom: float) -> RenderedPage | None:
+        """Return the in-memory render of a page if there is one, never rendering."""
+        key = (page_number, zoom)
+        with self._lock:
+            cached = self._page_cache.get(key)
+            if cached is not None:
+                self._page_cache.move_to_end(key)
+            return cached
+
+    def shrunk_render(self, page_number: int, zoom: float) -> RenderedPage | None:
+        """Box-filter a cached, larger render of a page down towards *zoom*.
+
+        Halves the nearest larger render ``int(log2(ratio))`` times with
+        ``Pixmap.shrink`` so at most a <2x resample is left for the caller.
+        Returns None when no larger render of the page is cached.
+        """
+        with self._lock:
+            larger = [
+                (z, r) for (p, z), r in self._page_cache.items()
+                if p == page_number and z > zoom
+            ]
+            if not larger:
+                return None
+            src_zoom, src = min(larger, key=lambda item: item[0])
+            k = int(math.log2(src_zoom / zoom))
+            if k < 1:
+                return src
+            pix = fitz.Pixmap(src.pixmap)         # shrink() works in place
+            pix.shrink(k)
+        return RenderedPage(
+            pix.samples_mv, pix.width, pix.height, pix.stride, bool(pix.alpha), pix
+        )
+
+    def render_clip(self, page_number: int, clip: fitz.Rect, zoom: float) -> RenderedPage:
+        """Render only *clip* of a page; bypasses every cache."""
+        with self._lock:
+            page = self._page(page_number)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip)
+        return RenderedPage(
+            pix.samples_mv,
+            pix.width,
+            pix.height,
+            pix.stride,
+            bool(pix.alpha),
+            pix,
+            pix.x,
+            pix.y,
+        )
+
+    def page_revision(self, page_number: int) -> int:
+        """Edit counter for a page, for keying caches held outside the engine."""
+        return self._page_revisions.get(page_number, 0)
+
+    def _invalidate_page(self, page_number: int):
+        """Drop every cached raster of *page_number* after it was modified."""
+        self._modified_pages.add(page_number)
+        self._page_revisions[page_number] = self.page_revision(page_number) + 1
+        for key in [k for k in self._page_cache if k[0] == page_number]:
+            del self._page_cache[key]
+
+    # ---------- On-disk render cache --------------------------------------
+    @classmethod
+    def _disk_cache_path(cls, doc_key: str, page_number: int, zoom: float) -> str:
+        return os.path.join(cls.DISK_CACHE_DIR, doc_key, f"{page_number}-{zoom:g}.png")
+
+    @classmethod
+    def _load_cached_png(cls, doc_key: str, page_number: int, zoom: float):
+        """Return the on-disk render of a page, or None."""
+        path = cls._disk_cache_path(doc_key, page_number, zoom)
+        if not os.path.exists(path):
+            return None
+        try:
+            pix = fitz.Pixmap(path)
+            os.utime(path)                        # refresh for LRU sweep
+        except Exception:                         # corrupt or vanished entry
+            return None
+        return pix
+
+    @classmethod
+    def _store_cached_png(cls, doc_key: str, page_number: int, zoom: float, pix):
+        path = cls._disk_cache_path(doc_key, page_number, zoom)
+        # Write under a unique name and rename, so readers never see half a PNG
+        tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pix.save(tmp, output="png")
+            os.replace(tmp, path)
+        except Exception:                         # cache is best-effort only
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    @classmethod
+    def _sweep_disk_cache(cls):
+        """Delete least recently used PNGs until the cache fits its limit."""
+        entries = []
+        for root, _dirs, files in os.walk(cls.DISK_CACHE_DIR):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= cls.DISK_CACHE_LIMIT:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
 
     # ---------- Form-field helpers ----------------------------------------
+    @staticmethod
+    def _page_widgets(page) -> list:
+        """Return the widgets of *page* (works on all PyMuPDF versions)."""
+        try:
+            widgets = page.widgets()              # modern API
+        except AttributeError:
+            widgets = []                          # page has none / old build
+        return list(widgets or [])
+
     def _iter_widgets(self):
-        """Yield every widget in every page (works on all PyMuPDF versions)."""
+        """Yield every widget in every page."""
         for pno in range(len(self.doc)):
-            page = self.doc.load_page(pno)
-            try:
-                widgets = page.widgets()          # modern API
-            except AttributeError:
-                widgets = []                      # page has none / old build
-            for w in widgets or []:
-                yield w
+            page = self._page(pno)
+            yield from self._page_widgets(page)
+
+    def _ensure_widget_index(self) -> dict[str, tuple[int, int]]:
+        """Map each field name to the location of its first widget."""
+        if self._widget_index is None:
+            index = {}
+            for pno in range(len(self.doc)):
+                page = self._page(pno)
+                for i, w in enumerate(self._page_widgets(page)):
+                    if w.field_name:
+                        index.setdefault(w.field_name, (pno, i))
+            self._widget_index = index
+        return self._widget_index
 
     def list_form_fields(self):
         """Return a list of {name, value, type} dicts for all form widgets."""
         fields = []
-        for w in self._iter_widgets():
-            if w.field_name:                      # skip un-named widgets
-                fields.append(
-                    {
-                        "name": w.field_name,
-                        "value": w.field_value,
-                        "type": w.field_type,
-                    }
-                )
+        with self._lock:
+            for w in self._iter_widgets():
+                if w.field_name:                  # skip un-named widgets
+                    fields.append(
+                        {
+                            "name": w.field_name,
+                            "value": w.field_value,
+                            "type": w.field_type,
+                        }
+                    )
         return fields
 
     def update_form_field(self, name: str, value: str):
         """Set a new value for the first widget matching *name*."""
-        for w in self._iter_widgets():
-            if w.field_name == name:
-                w.field_value = value
-                w.update()
-                return
+        self.update_form_fields({name: value})
+
+    def update_form_fields(self, updates: dict[str, str]):
+        """Apply many {name: value} updates, loading each touched page once."""
+        with self._lock:
+            index = self._ensure_widget_index()
+            by_page: dict[int, list[tuple[int, str]]] = {}
+            for name, value in updates.items():
+                loc = index.get(name)
+                if loc is not None:
+                    by_page.setdefault(loc[0], []).append((loc[1], value))
+
+            for pno, changes in by_page.items():
+                page = self._page(pno)        # widgets need their page alive
+                widgets = self._page_widgets(page)
+                for i, value in changes:
+                    widgets[i].field_value = value
+                    widgets[i].update()
+                self._invalidate_page(pno)
+                self._dirty_ops += len(changes)
 
     # ---------- Saving -----------------------------------------------------
-    def save(self, path: str, incremental: bool = False):
-        self.doc.save(path, incremental=incremental)
+    def is_source(self, path: str) -> bool:
+        """True if *path* is the file the document was opened from."""
+        return os.path.abspath(path) == os.path.abspath(self.path)
+
+    def can_save_incrementally(self) -> bool:
+        """True if the pending edits are few enough to append to the source.
+
+        MuPDF also refuses to append to a file it had to repair on open.
+        """
+        return (
+            bool(self.doc.can_save_incrementally())
+            and self._dirty_ops <= self.INCREMENTAL_SAVE_MAX_OPS
+        )
+
+    def save(
+        self,
+        path: str,
+        incremental: bool = False,
+        garbage: int | None = None,
+        deflate: bool | None = None,
+        clean: bool | None = None,
+    ):
+        """Write the document to *path* and continue editing that file.
+
+        Full saves default to dropping unused objects (``garbage=4``) and
+        compressing/sanitising streams; incremental saves cannot do either
+        and may only target the source file.
+        """
+        if incremental and not self.is_source(path):
+            raise ValueError("incremental needs original file")
+        if garbage is None:
+            garbage = 0 if incremental else 4
+        if deflate is None:
+            deflate = not incremental
+        if clean is None:
+            clean = not incremental
+        with self._lock:
+            if incremental:
+                # PyMuPDF refuses incremental saves of stream-opened documents,
+                # so append the update section through MuPDF directly.
+                opts = fitz.mupdf.PdfWriteOptions()
+                opts.do_incremental = 1
+                opts.do_garbage = garbage
+                opts.do_compress = deflate
+                opts.do_clean = opts.do_sanitize = clean
+                pdf = fitz.mupdf.pdf_document_from_fz_document(self.doc.this)
+                fitz.mupdf.pdf_save_document(pdf, path, opts)
+                self.close()
+            elif self.is_source(path):
+                # The source is mapped into memory, so write the rewrite
+                # beside it and swap it in once nothing holds the original.
+                tmp = f"{os.path.splitext(path)[0]}.{os.getpid()}.tmp.pdf"
+                try:
+                    self.doc.save(tmp, garbage=garbage, deflate=deflate, clean=clean)
+                except BaseException:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                    raise
+                self.close()
+                shutdown_render_pool(wait=True)  # workers keep the source open too
+                try:
+                    os.replace(tmp, path)
+                except OSError as e:
+                    # The edits now exist only in tmp – carry on from there
+                    self._open(tmp)
+                    raise OSError(
+                        f"Could not overwrite {path}; your changes were kept in {tmp}"
+                    ) from e
+            else:
+                self.doc.save(path, garbage=garbage, deflate=deflate, clean=clean)
+                self.close()
+            # MuPDF's in-memory state no longer matches any file on disk
+            # (garbage collection renumbers objects, an append moves the
+            # xref), so start over from what was just written. Rendered
+            # pages stay valid – the content is unchanged.
+            self._open(path)
 
 
     # ---------- Add Text -----------------------------------------------------
 
-    def insert_text(self, page_number: int, x: float, y: float, text: str, font_size: float = 12):
-        """Add permanent text to the page at (x, y)."""
-        page = self.doc.load_page(page_number)
-        page.insert_text((x, y), text, fontsize=font_size)
+    def insert_text(
+        self, page_number: int, x: float, y: float, text: str, font_size: float = 12
+    ) -> fitz.Rect:
+        """Add permanent text to the page at (x, y); return the area it covers."""
+        with self._lock:
+            page = self._page(page_number)
+            page.insert_text((x, y), text, fontsize=font_size)
+            self._invalidate_page(page_number)
+            self._dirty_ops += 1
+
+            if page.rotation:                     # text box is not axis-aligned
+                return page.rect
+            # Same metrics insert_text lays out with (Helvetica, default spacing)
+            font = fitz.Font("helv")
+            lines = text.splitlines() or [""]
+            width = max(font.text_length(line, fontsize=font_size) for line in lines)
+            line_height = font_size * (font.ascender - font.descender)
+            rect = fitz.Rect(
+                x,
+                y - font.ascender * font_size,
+                x + width,
+                y - font.descender * font_size + (len(lines) - 1) * line_height,
+            )
+            rect += (-1, -1, 1, 1)                # room for anti-aliasing
+            return rect & page.rect
+
+
+# ---------- Render worker processes ----------------------------------------
+_pool: ProcessPoolExecutor | None = None
+_worker_doc: tuple[str, fitz.Document] | None = None  # (doc key, doc) in a worker
+
+
+def _render_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs Qt threads is not safe
+        _pool = ProcessPoolExecutor(
+            max_workers=2, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def shutdown_render_pool(wait: bool = False):
+    """Stop the worker processes, dropping renders that have not started.
+
+    Pass ``wait=True`` to block until the workers have exited and closed
+    the files they had open.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait, cancel_futures=True)
+        _pool = None
+
+
+def _render_in_worker(path: str, doc_key: str, page_number: int, zoom: float):
+    """Render a page inside a pool process; return picklable raster fields."""
+    global _worker_doc
+    pix = PDFEngine._load_cached_png(doc_key, page_number, zoom)
+    if pix is None:
+        if _worker_doc is None or _worker_doc[0] != doc_key:
+            if _worker_doc is not None:
+                _worker_doc[1].close()
+            _worker_doc = (doc_key, fitz.open(path))
+        page = _worker_doc[1].load_page(page_number)
+        start = time.perf_counter()
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+        if time.perf_counter() - start >= PDFEngine.DISK_CACHE_MIN_RENDER_TIME:
+            PDFEngine._store_cached_png(doc_key, page_number, zoom, pix)
+    return pix.samples, pix.width, pix.height, pix.stride, bool(pix.alpha)
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import fitz
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_engine import PDFEngine  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def disk_cache(tmp_path, monkeypatch):
+    """Keep rendered pages out of the real ~/.cache."""
+    monkeypatch.setattr(PDFEngine, "DISK_CACHE_DIR", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "doc.pdf"
+    doc = fitz.open()
+    for n in range(3):
+        doc.new_page().insert_text((72, 72), f"Page {n + 1}")
+    doc.save(path)
+    doc.close()
+    return str(path)
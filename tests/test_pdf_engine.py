@@ -0,0 +1,72 @@
+import os
+
+import fitz
+import pytest
+
+from pdf_engine import PDFEngine
+
+
+def page_text(path, page=0):
+    with fitz.open(path) as doc:
+        return doc[page].get_text()
+
+
+def test_failed_replace_keeps_edits(pdf_path, monkeypatch):
+    engine = PDFEngine(pdf_path)
+    for n in range(PDFEngine.INCREMENTAL_SAVE_MAX_OPS + 5):
+        engine.insert_text(0, 72, 100 + n * 12, f"edit {n}")
+
+    def refuse(src, dst):
+        raise PermissionError("file in use")
+
+    monkeypatch.setattr(os, "replace", refuse)
+    with pytest.raises(OSError, match="changes were kept"):
+        engine.save(pdf_path)
+
+    assert not engine.is_source(pdf_path)
+    assert os.path.exists(engine.path)
+    assert "edit 24" in engine.doc[0].get_text()
+    assert "edit" not in page_text(pdf_path)
+    engine.close()
+
+
+def test_incremental_saves_then_full_rewrite(pdf_path):
+    engine = PDFEngine(pdf_path)
+    for n, label in enumerate(("first", "second")):
+        engine.insert_text(0, 72, 100 + n * 20, label)
+        assert engine.can_save_incrementally()
+        engine.save(pdf_path, incremental=True)
+    with open(pdf_path, "rb") as f:
+        assert f.read().count(b"%%EOF") == 3  # original plus two appended updates
+
+    engine.insert_text(1, 72, 100, "third")
+    engine.INCREMENTAL_SAVE_MAX_OPS = 0
+    assert not engine.can_save_incrementally()
+    engine.save(pdf_path)
+    engine.close()
+
+    with fitz.open(pdf_path) as doc:
+        assert not doc.is_repaired
+        assert doc.page_count == 3
+        assert "first" in doc[0].get_text() and "second" in doc[0].get_text()
+        assert "third" in doc[1].get_text()
+    with open(pdf_path, "rb") as f:
+        assert f.read().count(b"%%EOF") == 1
+    assert not [name for name in os.listdir(os.path.dirname(pdf_path)) if ".tmp" in name]
+
+
+def test_repaired_file_is_not_saved_incrementally(pdf_path):
+    with open(pdf_path, "rb") as f:
+        data = f.read()
+    start = data.rindex(b"startxref")
+    with open(pdf_path, "wb") as f:
+        f.write(data[:start] + b"startxref\n999999\n%%EOF\n")
+
+    engine = PDFEngine(pdf_path)
+    assert not engine.can_save_incrementally()
+    engine.insert_text(0, 72, 100, "fixed")
+    engine.save(pdf_path)
+    assert "fixed" in engine.doc[0].get_text()
+    engine.close()
+    with fitz.open(pdf_path) as doc:
+        assert not doc.is_repaired